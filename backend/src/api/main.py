@@ -1,28 +1,42 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, ORJSONResponse
 from pydantic import BaseModel, HttpUrl, Field
 from typing import List, Optional
 import os
+import asyncio
 import aiofiles
-from prometheus_client import Counter, Histogram, generate_latest
+import anyio
+from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from fastapi.responses import Response
 import time
+import queue
 import logging
+from logging.handlers import QueueHandler, QueueListener
 from dataclasses import asdict
 
-from ..services.document_processor import SemanticDocumentProcessor, ChunkMetadata
+from ..services.document_processor import SemanticDocumentProcessor, ChunkMetadata, doc_id, shutdown_pdf_pool
 from ..services.rag_service import RAGServiceWithCitations
+from ..services.cache import ResultCache
 from ..config import settings
 
-logging.basicConfig(level=logging.INFO)
+# Les appels de log ne font qu'enfiler l'enregistrement : l'écriture sur la sortie
+# standard est faite par un thread dédié, jamais par la boucle d'événements
+_log_queue = queue.SimpleQueue()
+_log_stream_handler = logging.StreamHandler()
+_log_stream_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+_log_listener = QueueListener(_log_queue, _log_stream_handler)
+logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(_log_queue)])
+_log_listener.start()
 logger = logging.getLogger(__name__)
 
 # Initialisation de l'application
 app = FastAPI(
     title="RAG System API with Citations & Deep Linking",
     description="API pour système RAG optimisé avec chunking sémantique, citations précises et deep linking",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Configuration CORS
@@ -38,6 +52,14 @@ app.add_middleware(
 query_counter = Counter('rag_queries_total', 'Total number of queries')
 query_duration = Histogram('rag_query_duration_seconds', 'Query duration')
 upload_counter = Counter('rag_uploads_total', 'Total number of uploads')
+cache_hits_counter = Counter('rag_cache_hits_total', 'Total number of cache hits', ['cache'])
+cache_misses_counter = Counter('rag_cache_misses_total', 'Total number of cache misses', ['cache'])
+
+# Dernier rendu des métriques, rafraîchi en tâche de fond (cf. _refresh_metrics)
+_metrics_cache: bytes = b""
+
+# Taille des blocs lus lors de la copie d'un upload sur disque
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
 
 # Initialisation des services
 rag_service = RAGServiceWithCitations(
@@ -45,7 +67,25 @@ rag_service = RAGServiceWithCitations(
     neo4j_user=settings.NEO4J_USER,
     neo4j_password=settings.NEO4J_PASSWORD,
     ollama_url=settings.OLLAMA_URL,
-    frontend_base_url=settings.FRONTEND_URL  # À ajouter dans config
+    frontend_base_url=settings.FRONTEND_URL,  # À ajouter dans config
+    embedding_batch_size=settings.EMBEDDING_BATCH_SIZE,
+    embedding_dim=settings.EMBEDDING_DIM,
+    neo4j_database=settings.NEO4J_DATABASE,
+    neo4j_pool_size=settings.NEO4J_POOL_SIZE,
+    neo4j_acquisition_timeout=settings.NEO4J_ACQ_TIMEOUT,
+    neo4j_max_connection_lifetime=settings.NEO4J_MAX_CONN_LIFETIME,
+    vector_quantization=settings.VECTOR_QUANTIZATION,
+    vector_rerank_factor=settings.VECTOR_RERANK_FACTOR,
+    embedding_cache_size=settings.EMBEDDING_CACHE_SIZE,
+    embedding_cache_dir=settings.EMBEDDING_CACHE_DIR,
+    embedding_cache_size_limit=settings.EMBEDDING_CACHE_SIZE_LIMIT,
+    embedding_concurrency=settings.EMBEDDING_CONCURRENCY,
+    write_batch_size=settings.NEO4J_WRITE_BATCH_SIZE,
+    semantic_cache_threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    semantic_cache_size=settings.SEMANTIC_CACHE_SIZE,
+    semantic_cache_ttl=settings.SEMANTIC_CACHE_TTL,
+    redis_url=settings.REDIS_URL,
+    embedding_dim_file=settings.EMBEDDING_DIM_FILE
 )
 
 doc_processor = SemanticDocumentProcessor(
@@ -53,6 +93,41 @@ doc_processor = SemanticDocumentProcessor(
     chunk_overlap=50
 )
 
+# Requêtes Cypher (constantes paramétrées : plans d'exécution réutilisés par Neo4j)
+# chunk_count est maintenu sur le Document à l'écriture : pas de parcours des chunks
+_LIST_DOCS_CYPHER = """
+MATCH (d:Document)
+RETURN d.id as id,
+       d.filename as filename, 
+       d.created_at as created_at,
+       d.total_pages as total_pages,
+       coalesce(d.chunk_count, 0) as chunk_count
+ORDER BY d.created_at DESC
+"""
+
+# Cache des résultats (/query, /chunk, /document), vidé à chaque upload ou suppression
+result_cache = ResultCache(
+    redis_url=settings.REDIS_URL,
+    local_maxsize=settings.QUERY_CACHE_SIZE
+)
+
+
+async def _cached(namespace: str, key: str, ttl: int, compute, *args, **kwargs):
+    """Cache-aside : retourne la valeur en cache ou l'obtient via compute (exécuté dans le pool de threads)"""
+    value = await result_cache.get(namespace, key)
+    if value is not None:
+        cache_hits_counter.labels(namespace).inc()
+        return value
+    
+    cache_misses_counter.labels(namespace).inc()
+    generation = result_cache.generation
+    value = await run_in_threadpool(compute, *args, **kwargs)
+    # Ne pas mettre en cache un résultat calculé avant une invalidation
+    if value and generation == result_cache.generation:
+        await result_cache.set(namespace, key, value, ttl)
+    return value
+
+
 # Modèles Pydantic
 
 class Citation(BaseModel):
@@ -134,7 +209,7 @@ async def root():
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Vérifie l'état de santé du système"""
-    health = rag_service.health_check()
+    health = await run_in_threadpool(rag_service.health_check)
     
     status = "healthy" if all(v == "ok" for v in health.values()) else "degraded"
     
@@ -158,7 +233,11 @@ async def query(request: QueryRequest):
     start_time = time.time()
     
     try:
-        result = rag_service.query(
+        result = await _cached(
+            "q",
+            ResultCache.make_key(request.question, request.top_k, request.min_similarity),
+            settings.QUERY_CACHE_TTL,
+            rag_service.query,
             question=request.question,
             top_k=request.top_k,
             min_similarity=request.min_similarity
@@ -167,30 +246,30 @@ async def query(request: QueryRequest):
         processing_time = time.time() - start_time
         query_duration.observe(processing_time)
         
-        # Debug : log les citations avant validation Pydantic
-        logger.info(f"📚 Citations reçues du RAG service : {len(result['citations'])}")
-        for i, citation in enumerate(result['citations']):
-            logger.info(f"Citation {i}: {citation.keys()}")
-            logger.info(f"  - deep_link type: {type(citation.get('deep_link'))}, value: {citation.get('deep_link')}")
+        # Le service produit déjà la forme canonique des citations :
+        # détail et validation Pydantic seulement en mode debug
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📚 Citations reçues du RAG service : %d", len(result['citations']))
+            for i, citation in enumerate(result['citations']):
+                logger.debug("Citation %d: deep_link=%s", i, citation.get('deep_link'))
+            try:
+                for c in result['citations']:
+                    Citation(**c)
+            except Exception as e:
+                logger.error(f"❌ Erreur validation Pydantic: {e}")
+                logger.error(f"Données problématiques: {result['citations']}")
+                raise
         
-        # Validation et création de la réponse
-        try:
-            citations_validated = [Citation(**c) for c in result['citations']]
-        except Exception as e:
-            logger.error(f"❌ Erreur validation Pydantic: {e}")
-            logger.error(f"Données problématiques: {result['citations']}")
-            raise
-        
-        return QueryResponse(
-            answer=result['answer'],
-            citations=citations_validated,
-            context_used=result['context_used'],
-            processing_time=processing_time,
-            has_valid_citations=result.get('has_valid_citations', False)
-        )
+        return ORJSONResponse({
+            'answer': result['answer'],
+            'citations': result['citations'],
+            'context_used': result['context_used'],
+            'processing_time': processing_time,
+            'has_valid_citations': result.get('has_valid_citations', False)
+        })
         
     except Exception as e:
-        logger.error(f"❌ Erreur lors de la requête RAG: {e}", exc_info=True)
+        logger.exception("❌ Erreur lors de la requête RAG (question=%r, top_k=%d)", request.question, request.top_k)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -201,7 +280,10 @@ async def get_chunk(chunk_id: str):
     Utilisé pour le deep linking depuis le frontend
     """
     try:
-        chunk = rag_service.get_chunk_by_id(chunk_id)
+        chunk = await _cached(
+            "chunk", chunk_id, settings.ENTITY_CACHE_TTL,
+            rag_service.get_chunk_by_id, chunk_id
+        )
         
         if not chunk:
             raise HTTPException(status_code=404, detail="Chunk non trouvé")
@@ -225,7 +307,10 @@ async def get_document_chunks(
     Optionnellement filtré par page
     """
     try:
-        chunks = rag_service.get_document_chunks(filename, page_number)
+        chunks = await _cached(
+            "doc", ResultCache.make_key(filename, page_number), settings.ENTITY_CACHE_TTL,
+            rag_service.get_document_chunks, filename, page_number
+        )
         
         if not chunks:
             raise HTTPException(
@@ -271,24 +356,26 @@ async def upload_file(file: UploadFile = File(...)):
     file_path = os.path.join(upload_dir, file.filename)
     
     try:
+        # Copie par blocs : mémoire bornée quelle que soit la taille du fichier
         async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await f.write(chunk)
         
-        # Traiter le document avec chunking sémantique
+        # Chunking sémantique et stockage Neo4j au fil de l'eau, par batches de chunks.
+        # Travail bloquant : exécuté hors de la boucle d'événements
         logger.info(f"📄 Traitement du fichier: {file.filename}")
-        chunks = doc_processor.process_document(file_path)
-        
-        # Stocker dans Neo4j
-        logger.info(f"💾 Stockage de {len(chunks)} chunks dans Neo4j")
-        rag_service.store_document_chunks(chunks)
+        chunks_created = await run_in_threadpool(
+            rag_service.store_document_chunks,
+            doc_processor.iter_chunks(file_path)
+        )
+        await result_cache.clear()
         
         processing_time = time.time() - start_time
         
         return UploadResponse(
             message="Fichier traité avec succès",
             filename=file.filename,
-            chunks_created=len(chunks),
+            chunks_created=chunks_created,
             processing_time=processing_time
         )
     
@@ -300,71 +387,85 @@ async def upload_file(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/documents")
-async def list_documents():
-    """Liste tous les documents stockés avec leurs statistiques"""
-    with rag_service.driver.session() as session:
-        result = session.run(
-            """
-            MATCH (d:Document)
-            OPTIONAL MATCH (d)-[:CONTAINS]->(c:Chunk)
-            RETURN d.filename as filename, 
-                   d.created_at as created_at,
-                   d.total_pages as total_pages,
-                   count(c) as chunk_count
-            ORDER BY d.created_at DESC
-            """
-        )
+def _list_documents() -> list:
+    """Lecture bloquante des documents (exécutée dans le pool de threads)"""
+    with rag_service.session(read_only=True) as session:
+        result = session.run(_LIST_DOCS_CYPHER)
         
         documents = []
         for record in result:
             documents.append({
+                'id': record['id'],
                 'filename': record['filename'],
                 'created_at': str(record['created_at']),
                 'total_pages': record['total_pages'],
                 'chunk_count': record['chunk_count']
             })
         
-        return {"documents": documents, "total": len(documents)}
+        return documents
+
+
+@app.get("/documents")
+async def list_documents():
+    """Liste tous les documents stockés avec leurs statistiques"""
+    documents = await run_in_threadpool(_list_documents)
+    return {"documents": documents, "total": len(documents)}
 
 
 @app.delete("/documents/{filename}")
 async def delete_document(filename: str):
     """Supprime un document et tous ses chunks"""
-    import hashlib
-    
-    doc_id = hashlib.md5(filename.encode()).hexdigest()
+    deleted = await run_in_threadpool(rag_service.delete_document, doc_id(filename))
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Document non trouvé")
     
-    with rag_service.driver.session() as session:
-        result = session.run(
-            """
-            MATCH (d:Document {id: $doc_id})
-            OPTIONAL MATCH (d)-[:CONTAINS]->(c:Chunk)
-            DETACH DELETE d, c
-            RETURN count(d) as deleted_count
-            """,
-            doc_id=doc_id
-        )
-        
-        record = result.single()
-        if record['deleted_count'] == 0:
-            raise HTTPException(status_code=404, detail="Document non trouvé")
-        
-        logger.info(f"🗑️ Document '{filename}' supprimé")
-        return {"message": f"Document '{filename}' supprimé avec succès"}
+    await result_cache.clear()
+    logger.info(f"🗑️ Document '{filename}' supprimé")
+    return {"message": f"Document '{filename}' supprimé avec succès"}
+
+
+async def _refresh_metrics():
+    """Pré-calcule périodiquement le rendu des métriques hors du chemin des requêtes"""
+    global _metrics_cache
+    while True:
+        try:
+            _metrics_cache = await run_in_threadpool(generate_latest)
+        except Exception as e:
+            logger.warning(f"⚠️ Rafraîchissement des métriques impossible: {e}")
+        await asyncio.sleep(settings.METRICS_REFRESH_INTERVAL)
 
 
 @app.get("/metrics")
-async def metrics():
+async def metrics(fresh: bool = Query(False, description="Recalculer les métriques au lieu du dernier rendu")):
     """Expose les métriques Prometheus"""
-    return Response(content=generate_latest(), media_type="text/plain")
+    content = generate_latest() if fresh or not _metrics_cache else _metrics_cache
+    return Response(content=content, media_type=CONTENT_TYPE_LATEST)
+
+
+@app.on_event("startup")
+async def startup_event():
+    """Dimensionne le pool de threads, lance le rendu des métriques et prépare la base Neo4j"""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.THREADPOOL_SIZE
+    app.state.metrics_task = asyncio.create_task(_refresh_metrics())
+    
+    try:
+        await run_in_threadpool(rag_service.create_indexes)
+        # Résultats en cache (Redis) calculés avec les anciens identifiants
+        if await run_in_threadpool(rag_service.migrate_document_ids):
+            await result_cache.clear()
+    except Exception as e:
+        logger.warning(f"⚠️ Préparation de la base Neo4j impossible: {e}")
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Ferme les connexions proprement"""
     logger.info("🔌 Fermeture des connexions...")
+    app.state.metrics_task.cancel()
     rag_service.close()
+    shutdown_pdf_pool()
+    await result_cache.close()
+    _log_listener.stop()
 
 
 if __name__ == "__main__":
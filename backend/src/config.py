@@ -8,15 +8,40 @@ class Settings(BaseSettings):
     NEO4J_URI: str = "bolt://localhost:7687"
     NEO4J_USER: str = "neo4j"
     NEO4J_PASSWORD: str = "ragpassword123"
+    NEO4J_DATABASE: str = "neo4j"
+    NEO4J_POOL_SIZE: int = 50
+    NEO4J_ACQ_TIMEOUT: float = 30.0  # secondes
+    NEO4J_MAX_CONN_LIFETIME: float = 3600.0  # secondes
+    NEO4J_WRITE_BATCH_SIZE: int = 1000  # chunks écrits par transaction à l'ingestion
     
     # Ollama
     OLLAMA_URL: str = "http://localhost:11434"
     LLM_MODEL: str = "mistral"
     EMBEDDING_MODEL: str = "nomic-embed-text"
+    EMBEDDING_DIM: int = 768  # nomic-embed-text
+    EMBEDDING_DIM_FILE: str = ".cache/embedding_dims.json"  # dimension relevée, par modèle
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_CONCURRENCY: int = 4  # batches embeddés en parallèle pendant l'ingestion
+    EMBEDDING_CACHE_SIZE: int = 4096  # embeddings de requêtes gardés en mémoire (LRU)
+    EMBEDDING_CACHE_DIR: Optional[str] = None  # si défini, cache persistant sur disque
+    EMBEDDING_CACHE_SIZE_LIMIT: int = 512 * 1024 * 1024  # octets, cache disque
+    VECTOR_QUANTIZATION: bool = True  # index vectoriel quantifié (int8)
+    VECTOR_RERANK_FACTOR: int = 4  # candidats lus dans l'index par résultat, rescorés en float32
     
     # Application
     UPLOAD_DIR: str = "uploads"
     MAX_FILE_SIZE: int = 50 * 1024 * 1024  # 50MB
+    THREADPOOL_SIZE: int = 32  # Threads pour le parsing / Neo4j / Ollama bloquants
+    METRICS_REFRESH_INTERVAL: float = 2.0  # secondes entre deux rendus de /metrics
+    
+    # Cache des résultats (Redis si REDIS_URL est défini, sinon en mémoire)
+    REDIS_URL: Optional[str] = None
+    QUERY_CACHE_SIZE: int = 1024
+    QUERY_CACHE_TTL: int = 120  # secondes, résultats de recherche
+    ENTITY_CACHE_TTL: int = 300  # secondes, chunks et documents
+    SEMANTIC_CACHE_THRESHOLD: float = 0.97  # similarité cosinus minimale entre deux questions
+    SEMANTIC_CACHE_SIZE: int = 256
+    SEMANTIC_CACHE_TTL: int = 600  # secondes
     
     # Frontend
     FRONTEND_URL: str = "http://localhost:3000"
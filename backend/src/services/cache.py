@@ -0,0 +1,212 @@
+from typing import Any, Dict, Hashable, List, Optional, Sequence
+import hashlib
+import logging
+import threading
+import time
+
+import numpy as np
+
+import orjson
+from cachetools import TTLCache
+from redis import Redis as SyncRedis
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """Cache-aside des résultats de l'API
+
+    Utilise Redis lorsqu'une URL est configurée (cache partagé entre workers
+    et réplicas), sinon un TTLCache en mémoire par espace de noms.
+    """
+
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        local_maxsize: int = 1024,
+        prefix: str = "rag"
+    ):
+        self.prefix = prefix
+        self.local_maxsize = local_maxsize
+        self.redis = Redis.from_url(redis_url) if redis_url else None
+        self._local: Dict[str, TTLCache] = {}
+        # Incrémenté à chaque invalidation, pour ignorer les résultats calculés avant
+        self.generation = 0
+
+        backend = "Redis" if self.redis is not None else "mémoire"
+        logger.info(f"✅ ResultCache initialisé (backend={backend})")
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Clé adressée par contenu (blake2b-128) à partir des paramètres de la requête"""
+        return hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=16).hexdigest()
+
+    def _redis_key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}:{namespace}:{key}"
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Retourne la valeur en cache ou None"""
+        if self.redis is None:
+            cache = self._local.get(namespace)
+            return cache.get(key) if cache is not None else None
+
+        try:
+            raw = await self.redis.get(self._redis_key(namespace, key))
+        except Exception as e:
+            logger.warning(f"⚠️ Lecture cache Redis impossible: {e}")
+            return None
+        return orjson.loads(raw) if raw is not None else None
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: int) -> None:
+        """Stocke une valeur avec une durée de vie en secondes"""
+        if self.redis is None:
+            cache = self._local.get(namespace)
+            if cache is None:
+                cache = self._local[namespace] = TTLCache(maxsize=self.local_maxsize, ttl=ttl)
+            cache[key] = value
+            return
+
+        try:
+            await self.redis.set(self._redis_key(namespace, key), orjson.dumps(value), ex=ttl)
+        except Exception as e:
+            logger.warning(f"⚠️ Écriture cache Redis impossible: {e}")
+
+    async def clear(self) -> None:
+        """Invalide toutes les entrées (le corpus a changé)"""
+        self.generation += 1
+        self._local.clear()
+
+        if self.redis is None:
+            return
+
+        try:
+            keys = [key async for key in self.redis.scan_iter(match=f"{self.prefix}:*", count=500)]
+            for i in range(0, len(keys), 500):
+                await self.redis.unlink(*keys[i:i + 500])
+        except Exception as e:
+            logger.warning(f"⚠️ Invalidation cache Redis impossible: {e}")
+
+    async def close(self) -> None:
+        if self.redis is not None:
+            await self.redis.aclose()
+
+
+class SemanticCache:
+    """Cache de réponses indexé par l'embedding de la question
+    
+    Une question dont l'embedding (unitaire) a une similarité cosinus
+    >= threshold avec une question déjà traitée, pour les mêmes paramètres,
+    réutilise sa réponse sans recherche ni appel au LLM.
+    
+    Les embeddings sont rangés dans une matrice float32 (tampon circulaire de
+    maxsize lignes) : toutes les entrées sont scorées par un seul produit
+    matrice-vecteur (BLAS) au lieu d'une boucle Python. maxsize=0 désactive le cache.
+    
+    Le cache reste local au processus, mais avec redis_url son invalidation est
+    partagée : clear() incrémente une génération dans Redis, et chaque worker
+    vide son cache dès qu'il voit qu'elle a changé.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.97,
+        maxsize: int = 256,
+        ttl: float = 600.0,
+        redis_url: Optional[str] = None,
+        generation_key: str = "rag:semantic:generation"
+    ):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Allouée au premier ajout, quand la dimension est connue
+        self._matrix: Optional[np.ndarray] = None
+        self._expires = np.zeros(maxsize)  # 0 : emplacement libre
+        self._params: List[Hashable] = [None] * maxsize
+        self._values: List[Any] = [None] * maxsize
+        self._next = 0  # prochain emplacement à écrire (le plus ancien)
+        self._lock = threading.Lock()
+        # Incrémenté à chaque invalidation, pour ignorer les réponses calculées avant
+        self.generation = 0
+        # Génération partagée entre workers (client synchrone : appelé depuis des threads)
+        self.redis = SyncRedis.from_url(redis_url) if redis_url else None
+        self.generation_key = generation_key
+        self._shared_generation: Optional[int] = None
+
+    def get(self, embedding: Sequence[float], params: Hashable = None) -> Optional[Any]:
+        """Retourne la valeur de l'entrée la plus proche au-dessus du seuil, ou None"""
+        if not self.maxsize or not self._sync_generation():
+            return None
+        query = np.asarray(embedding, dtype=np.float32)
+
+        with self._lock:
+            if self._matrix is None:
+                return None
+
+            candidates = self._expires > time.monotonic()
+            candidates &= np.fromiter((p == params for p in self._params), dtype=bool, count=self.maxsize)
+            if not candidates.any():
+                return None
+
+            scores = self._matrix @ query
+            scores[~candidates] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            return self._values[best]
+
+    def set(
+        self,
+        embedding: Sequence[float],
+        value: Any,
+        params: Hashable = None,
+        generation: Optional[int] = None
+    ) -> None:
+        """Ajoute une entrée, sauf si le cache a été invalidé depuis generation"""
+        if not self.maxsize or not self._sync_generation():
+            return
+        vector = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if self._matrix is None:
+                self._matrix = np.zeros((self.maxsize, vector.shape[0]), dtype=np.float32)
+
+            slot = self._next
+            self._matrix[slot] = vector
+            self._expires[slot] = time.monotonic() + self.ttl
+            self._params[slot] = params
+            self._values[slot] = value
+            self._next = (slot + 1) % self.maxsize
+
+    def clear(self) -> None:
+        """Invalide toutes les entrées (le corpus a changé), dans tous les workers"""
+        if self.redis is not None:
+            try:
+                self.redis.incr(self.generation_key)
+            except Exception as e:
+                logger.warning(f"⚠️ Invalidation du cache sémantique partagé impossible: {e}")
+        with self._lock:
+            self._clear_locked()
+
+    def _sync_generation(self) -> bool:
+        """Vide le cache local si un autre worker l'a invalidé. False si Redis est injoignable"""
+        if self.redis is None:
+            return True
+        try:
+            shared = int(self.redis.get(self.generation_key) or 0)
+        except Exception as e:
+            logger.warning(f"⚠️ Lecture de la génération du cache sémantique impossible: {e}")
+            return False
+        with self._lock:
+            if shared != self._shared_generation:
+                self._shared_generation = shared
+                self._clear_locked()
+        return True
+
+    def _clear_locked(self) -> None:
+        """Vide les entrées (appelant détenteur du verrou)"""
+        self.generation += 1
+        self._expires[:] = 0
+        self._params = [None] * self.maxsize
+        self._values = [None] * self.maxsize
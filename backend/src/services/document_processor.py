@@ -1,16 +1,175 @@
 import os
 import re
+import string
+import codecs
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+import threading
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Iterable
 from pathlib import Path
-import pypdf
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import fitz  # PyMuPDF
 import docx
-import chardet
+from chardet.universaldetector import UniversalDetector
 from dataclasses import dataclass
+from functools import lru_cache
+from itertools import chain
 import hashlib
 
 logger = logging.getLogger(__name__)
 
+# Expressions régulières compilées une seule fois (appelées pour chaque paragraphe)
+_PARA_SPLIT = re.compile(r'\n\s*\n')
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+(?=[A-Z])')
+# Préfixes de titre numéroté et de liste réunis dans une seule alternance :
+# un seul appel à match() classe le début du paragraphe.
+# numtitle est testé en premier car il recouvre le cas num.
+_PREFIX_RE = re.compile(
+    r'(?P<numtitle>\d+\.\s+[A-Z])'   # 1. Introduction
+    r'|(?P<bullet>[\-\•\*]\s+)'      # - item, • item, * item
+    r'|(?P<num>\d+[\.\)]\s+)'        # 1. item, 1) item
+    r'|(?P<alpha>[a-z][\.\)]\s+)'     # a. item, a) item
+    r'|(?P<roman>[ivxIVX]+[\.\)]\s+)' # i. item, IV) item (chiffres romains)
+)
+
+
+@lru_cache(maxsize=4096)
+def doc_id(filename: str) -> str:
+    """Identifiant stable d'un document, dérivé de son nom de fichier
+    
+    Seule source de vérité : utilisée à l'ingestion, à la suppression et dans
+    les liens profonds (le frontend la retrouve via le champ id de /documents).
+    """
+    return hashlib.blake2b(filename.encode(), digest_size=16).hexdigest()
+
+
+_ASCII_UPPER = string.ascii_uppercase.encode()
+_ASCII_LOWER = string.ascii_lowercase.encode()
+
+
+def _count_upper_alpha(text: str) -> Tuple[int, int]:
+    """Compte les majuscules et les lettres d'un texte
+    
+    Texte ASCII (cas le plus courant) : bytes.translate supprime les lettres
+    en C et les comptes se déduisent des longueurs, sans appel Python par caractère.
+    """
+    if not text.isascii():
+        return sum(map(str.isupper, text)), sum(map(str.isalpha, text))
+    
+    data = text.encode('ascii')
+    without_upper = data.translate(None, _ASCII_UPPER)
+    without_alpha = without_upper.translate(None, _ASCII_LOWER)
+    return len(data) - len(without_upper), len(data) - len(without_alpha)
+
+
+_TITLE_STYLE_KEYWORDS = ('heading', 'title', 'titre', 'head')
+
+
+@lru_cache(maxsize=256)
+def _is_title_style(style_name: str) -> bool:
+    """Détecte si un style Word est un titre
+    
+    Un document n'utilise que quelques styles : le résultat est mis en cache.
+    """
+    style_name = style_name.lower()
+    return any(keyword in style_name for keyword in _TITLE_STYLE_KEYWORDS)
+
+
+# Taille de l'échantillon lu pour le test rapide UTF-8 des fichiers texte
+ENCODING_SAMPLE_SIZE = 64 * 1024
+# Taille des blocs fournis au détecteur d'encodage incrémental
+ENCODING_DETECT_BLOCK_SIZE = 4096
+
+# Nombre de pages à partir duquel l'extraction PDF est répartie sur plusieurs processus
+PDF_PARALLEL_MIN_PAGES = 32
+
+# Processus d'extraction PDF, partagés par tous les uploads en cours
+PDF_POOL_WORKERS = os.cpu_count() or 1
+
+# Jamais de fork du serveur : il est multi-threadé (threads anyio, embeddings,
+# clients neo4j/httpx) et un enfant forké peut y rester bloqué sur un verrou
+_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+
+
+def _init_worker_logging(level: int) -> None:
+    """Logs d'un processus worker écrits directement sur stderr
+    
+    Le QueueHandler du serveur n'a pas de QueueListener dans le worker :
+    ses enregistrements y seraient perdus.
+    """
+    logging.basicConfig(level=level, format=logging.BASIC_FORMAT, force=True)
+
+
+def _new_process_pool(max_workers: Optional[int]) -> ProcessPoolExecutor:
+    """Pool de processus sans fork, avec une journalisation propre à chaque worker"""
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=_MP_CONTEXT,
+        initializer=_init_worker_logging,
+        initargs=(logging.getLogger().getEffectiveLevel(),)
+    )
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    """Pool de processus partagé, créé au premier gros PDF"""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = _new_process_pool(PDF_POOL_WORKERS)
+        return _pdf_pool
+
+
+def _discard_pdf_pool(pool: ProcessPoolExecutor) -> None:
+    """Abandonne un pool cassé : le prochain gros PDF en recrée un"""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is pool:
+            _pdf_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pdf_pool() -> None:
+    """Arrête les processus d'extraction PDF (arrêt de l'application)"""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        pool, _pdf_pool = _pdf_pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+def _iter_pdf_pages(file_path: str, start: int, stop: int) -> Iterator[Tuple[int, Optional[str]]]:
+    """Extrait le texte d'une plage de pages PDF, une page à la fois"""
+    with fitz.open(file_path) as pdf:
+        for page_index in range(start, stop):
+            try:
+                yield page_index + 1, pdf[page_index].get_text("text")
+            except Exception as e:
+                logger.warning(f"⚠️ Erreur page {page_index + 1}: {e}")
+                yield page_index + 1, None
+
+
+def _extract_pdf_pages(task: Tuple[str, int, int]) -> List[Tuple[int, Optional[str]]]:
+    """Extrait le texte d'une plage de pages PDF (exécutable dans un processus worker)"""
+    return list(_iter_pdf_pages(*task))
+
+
+@dataclass(slots=True)
+class Paragraph:
+    """Paragraphe extrait d'une page (slots : pas de dict par instance)"""
+    paragraph_number: int
+    text: str
+    start_char: int
+    end_char: int
+    semantic_type: str
+    word_count: int
+
+
 @dataclass
 class ChunkMetadata:
     """Métadonnées enrichies pour chaque chunk"""
@@ -37,7 +196,7 @@ class SemanticDocumentProcessor:
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
         self.max_file_size_mb = max_file_size_mb
-        self.supported_extensions = ['.pdf', '.txt', '.docx', '.doc']
+        self.supported_extensions = frozenset({'.pdf', '.txt', '.docx', '.doc'})
         
         logger.info(f"✅ DocumentProcessor initialisé (chunk_size={chunk_size}, overlap={chunk_overlap})")
     
@@ -48,94 +207,133 @@ class SemanticDocumentProcessor:
             raise ValueError(f"Fichier trop volumineux: {size_mb:.2f}MB (max: {self.max_file_size_mb}MB)")
     
     def detect_encoding(self, file_path: str) -> str:
-        """Détecte l'encodage d'un fichier texte"""
+        """Détecte l'encodage d'un fichier texte (test UTF-8 rapide puis détection incrémentale)"""
         try:
             with open(file_path, 'rb') as file:
-                raw_data = file.read(10240)
-                result = chardet.detect(raw_data)
-                confidence = result.get('confidence', 0)
-                encoding = result.get('encoding', 'utf-8')
+                sample = file.read(ENCODING_SAMPLE_SIZE)
+                
+                if sample.startswith(codecs.BOM_UTF8):
+                    return 'utf-8-sig'
                 
-                if confidence < 0.7:
+                # Chemin rapide : la plupart des fichiers sont en UTF-8. Le décodeur
+                # incrémental tolère un caractère coupé en fin d'échantillon, mais
+                # pas en fin de fichier (échantillon plus court que demandé).
+                try:
+                    codecs.getincrementaldecoder('utf-8')().decode(
+                        sample, final=len(sample) < ENCODING_SAMPLE_SIZE
+                    )
                     return 'utf-8'
-                return encoding
+                except UnicodeDecodeError:
+                    pass
+                
+                # Détection incrémentale par blocs : s'arrête dès que chardet est sûr
+                # de lui, mais peut lire tout le fichier si les caractères ambigus sont loin
+                detector = UniversalDetector()
+                view = memoryview(sample)
+                blocks = chain(
+                    (view[i:i + ENCODING_DETECT_BLOCK_SIZE] for i in range(0, len(view), ENCODING_DETECT_BLOCK_SIZE)),
+                    iter(lambda: file.read(ENCODING_DETECT_BLOCK_SIZE), b'')
+                )
+                for block in blocks:
+                    detector.feed(block)
+                    if detector.done:
+                        break
+                detector.close()
+            
+            confidence = detector.result.get('confidence') or 0
+            encoding = detector.result.get('encoding') or 'utf-8'
+            
+            if confidence < 0.7:
+                return 'utf-8'
+            return encoding
         except Exception:
             return 'utf-8'
     
-    def extract_text_from_pdf(self, file_path: str) -> List[Dict[str, Any]]:
-        """Extrait le texte d'un PDF avec structure préservée"""
-        pages = []
-        
-        with open(file_path, 'rb') as file:
-            pdf_reader = pypdf.PdfReader(file)
-            
-            for page_num, page in enumerate(pdf_reader.pages, start=1):
-                try:
-                    text = page.extract_text()
-                    if text.strip():
-                        # Détecter les paragraphes
-                        paragraphs = self._extract_paragraphs(text)
-                        
-                        pages.append({
-                            'page_number': page_num,
-                            'text': text,
-                            'paragraphs': paragraphs,
-                            'char_count': len(text)
-                        })
-                except Exception as e:
-                    logger.warning(f"⚠️ Erreur page {page_num}: {e}")
-                    continue
-        
-        return pages
+    def extract_text_from_pdf(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """Extrait le texte d'un PDF avec structure préservée, page par page
+        
+        Générateur : chaque page peut être découpée en chunks puis libérée
+        avant que la suivante ne soit construite.
+        """
+        with fitz.open(file_path) as pdf:
+            page_count = pdf.page_count
+        
+        # Les pages sont indépendantes : répartir les gros PDF par plages sur plusieurs processus
+        # (sauf si l'on est déjà dans un worker, cf. process_directory)
+        workers = min(PDF_POOL_WORKERS, page_count // PDF_PARALLEL_MIN_PAGES + 1)
+        if multiprocessing.parent_process() is not None:
+            workers = 1
+        if workers > 1:
+            step = -(-page_count // workers)
+            tasks = [(file_path, start, min(start + step, page_count)) for start in range(0, page_count, step)]
+            pool = _get_pdf_pool()
+            try:
+                # Les plages arrivent dans l'ordre, dès que chacune est prête
+                yield from self._build_pdf_pages(chain.from_iterable(pool.map(_extract_pdf_pages, tasks)))
+            except BrokenProcessPool:
+                _discard_pdf_pool(pool)
+                raise
+        else:
+            yield from self._build_pdf_pages(_iter_pdf_pages(file_path, 0, page_count))
+    
+    def _build_pdf_pages(self, extracted: Iterable[Tuple[int, Optional[str]]]) -> Iterator[Dict[str, Any]]:
+        """Structure les pages PDF non vides (paragraphes détectés)"""
+        for page_num, text in extracted:
+            if text and text.strip():
+                yield {
+                    'page_number': page_num,
+                    'text': text,
+                    'paragraphs': self._extract_paragraphs(text),
+                    'char_count': len(text)
+                }
     
     def extract_text_from_docx(self, file_path: str) -> List[Dict[str, Any]]:
         """Extrait le texte d'un document Word avec structure"""
         doc = docx.Document(file_path)
         paragraphs = []
-        current_page = 1  # Word n'a pas de concept de page direct
+        texts = []  # Textes des paragraphes, réutilisés pour le texte de la page et sa taille
+        char_position = 0  # Word n'a pas de concept de page direct : tout est en page 1
         
         for para_idx, para in enumerate(doc.paragraphs, start=1):
-            if para.text.strip():
-                paragraphs.append({
-                    'paragraph_number': para_idx,
-                    'text': para.text,
-                    'style': para.style.name if para.style else 'Normal',
-                    'is_title': self._is_title_style(para.style.name if para.style else ''),
-                    'semantic_type': 'title' if self._is_title_style(para.style.name if para.style else '') else self._detect_semantic_type(para.text)
-                })
+            para_text = para.text
+            if para_text.strip():
+                style_name = para.style.name if para.style else ''
+                paragraphs.append(Paragraph(
+                    paragraph_number=para_idx,
+                    text=para_text,
+                    start_char=char_position,
+                    end_char=char_position + len(para_text),
+                    semantic_type='title' if _is_title_style(style_name) else self._detect_semantic_type(para_text),
+                    word_count=len(para_text.split())
+                ))
+                texts.append(para_text)
+                char_position += len(para_text) + 1  # +1 pour le \n
         
         return [{
             'page_number': 1,
             'paragraphs': paragraphs,
-            'text': '\n'.join([p['text'] for p in paragraphs]),
-            'char_count': sum(len(p['text']) for p in paragraphs)
+            'text': '\n'.join(texts),
+            'char_count': sum(map(len, texts))
         }]
     
-    def extract_text_from_txt(self, file_path: str) -> List[Dict[str, Any]]:
+    def extract_text_from_txt(self, file_path: str) -> Iterator[Dict[str, Any]]:
         """Extrait le texte d'un fichier texte avec structure"""
         encoding = self.detect_encoding(file_path)
         
         with open(file_path, 'r', encoding=encoding, errors='replace') as file:
             text = file.read()
         
-        paragraphs = self._extract_paragraphs(text)
-        
-        return [{
+        yield {
             'page_number': 1,
-            'paragraphs': paragraphs,
+            'paragraphs': self._extract_paragraphs(text),
             'text': text,
             'char_count': len(text)
-        }]
+        }
     
-    def _is_title_style(self, style_name: str) -> bool:
-        """Détecte si un style est un titre"""
-        title_keywords = ['heading', 'title', 'titre', 'head']
-        return any(keyword in style_name.lower() for keyword in title_keywords)
-    
-    def _extract_paragraphs(self, text: str) -> List[Dict[str, Any]]:
+    def _extract_paragraphs(self, text: str) -> List[Paragraph]:
         """Extrait les paragraphes d'un texte avec leurs métadonnées"""
         # Découper par double saut de ligne ou par ligne unique pour les titres
-        raw_paragraphs = re.split(r'\n\s*\n', text)
+        raw_paragraphs = _PARA_SPLIT.split(text)
         
         paragraphs = []
         char_position = 0
@@ -148,14 +346,14 @@ class SemanticDocumentProcessor:
             # Détecter le type sémantique
             semantic_type = self._detect_semantic_type(para_text)
             
-            paragraphs.append({
-                'paragraph_number': para_idx,
-                'text': para_text,
-                'start_char': char_position,
-                'end_char': char_position + len(para_text),
-                'semantic_type': semantic_type,
-                'word_count': len(para_text.split())
-            })
+            paragraphs.append(Paragraph(
+                paragraph_number=para_idx,
+                text=para_text,
+                start_char=char_position,
+                end_char=char_position + len(para_text),
+                semantic_type=semantic_type,
+                word_count=len(para_text.split())
+            ))
             
             char_position += len(para_text) + 2  # +2 pour les \n\n
         
@@ -166,11 +364,13 @@ class SemanticDocumentProcessor:
         
         # Nettoyer le texte
         text_clean = text.strip()
+        prefix = _PREFIX_RE.match(text_clean)
         
         # Titre : court (< 100 chars), en majuscules, ou se termine par ':'
         if len(text_clean) < 100:
             # Tous en majuscules (au moins 50% de lettres majuscules)
-            uppercase_ratio = sum(1 for c in text_clean if c.isupper()) / max(1, sum(1 for c in text_clean if c.isalpha()))
+            upper_count, alpha_count = _count_upper_alpha(text_clean)
+            uppercase_ratio = upper_count / max(1, alpha_count)
             if uppercase_ratio > 0.5:
                 return 'title'
             
@@ -179,52 +379,42 @@ class SemanticDocumentProcessor:
                 return 'title'
             
             # Commence par un numéro suivi d'un point (ex: "1. Introduction")
-            if re.match(r'^\d+\.\s+[A-Z]', text_clean):
+            if prefix is not None and prefix.lastgroup == 'numtitle':
                 return 'title'
         
         # Liste : commence par -, •, *, numéro, lettre avec parenthèse
-        list_patterns = [
-            r'^[\-\•\*]\s+',           # - item, • item, * item
-            r'^\d+[\.\)]\s+',          # 1. item, 1) item
-            r'^[a-z][\.\)]\s+',        # a. item, a) item
-            r'^[ivxIVX]+[\.\)]\s+',    # i. item, IV) item (chiffres romains)
-        ]
-        
-        for pattern in list_patterns:
-            if re.match(pattern, text_clean):
-                return 'list'
+        if prefix is not None:
+            return 'list'
         
         # Table : contient beaucoup de séparateurs (|, \t) ou alignements
         if text_clean.count('|') > 3 or text_clean.count('\t') > 5:
             return 'table'
         
-        # Détection de tableaux avec espaces alignés
-        lines = text_clean.split('\n')
-        if len(lines) > 2:
-            # Vérifier si plusieurs lignes ont des espacements similaires
-            space_counts = [line.count('  ') for line in lines]
-            if len(set(space_counts)) < len(space_counts) / 2 and max(space_counts) > 2:
-                return 'table'
+        # Détection de tableaux avec espaces alignés (au moins 3 lignes) :
+        # la plupart des paragraphes n'ont pas 2 retours à la ligne, inutile de découper
+        if text_clean.count('\n') < 2:
+            return 'paragraph'
+        
+        # Vérifier si plusieurs lignes ont des espacements similaires
+        space_counts = [line.count('  ') for line in text_clean.split('\n')]
+        if max(space_counts) > 2 and len(set(space_counts)) < len(space_counts) / 2:
+            return 'table'
         
         # Paragraphe normal par défaut
         return 'paragraph'
     
     def _split_into_sentences(self, text: str) -> List[str]:
         """Découpe un texte en phrases de manière simple"""
-        # Patterns de fin de phrase
-        sentence_endings = r'(?<=[.!?])\s+(?=[A-Z])'
+        # Découper aux fins de phrase suivies d'une majuscule
+        sentences = _SENTENCE_SPLIT.split(text)
         
-        sentences = re.split(sentence_endings, text)
-        
-        # Nettoyer et filtrer les phrases vides
-        sentences = [s.strip() for s in sentences if s.strip()]
-        
-        return sentences
+        # Nettoyer et filtrer les phrases vides (un seul strip par phrase)
+        return [s for s in map(str.strip, sentences) if s]
     
     def semantic_chunk_text(
         self, 
         text: str, 
-        paragraphs: List[Dict[str, Any]],
+        paragraphs: List[Paragraph],
         page_number: int,
         filename: str,
         doc_id: str
@@ -239,19 +429,22 @@ class SemanticDocumentProcessor:
     def _semantic_chunking_basic(
         self,
         text: str,
-        paragraphs: List[Dict[str, Any]],
+        paragraphs: List[Paragraph],
         page_number: int,
         filename: str,
         doc_id: str
     ) -> List[ChunkMetadata]:
         """Chunking basique préservant les paragraphes"""
         chunks = []
+        # Paragraphes du chunk en cours et leurs textes (joints une seule fois à l'émission)
         current_chunk = []
+        current_texts = []
         current_length = 0
         chunk_start_para = 0
+        chunk_idx = 0
         
         for para in paragraphs:
-            para_text = para['text']
+            para_text = para.text
             para_length = len(para_text)
             
             # Si le paragraphe seul dépasse la taille max, le découper
@@ -264,15 +457,19 @@ class SemanticDocumentProcessor:
                         chunk_start_para,
                         filename,
                         doc_id,
-                        len(chunks)
+                        chunk_idx,
+                        '\n\n'.join(current_texts)
                     ))
+                    chunk_idx += 1
                     current_chunk = []
+                    current_texts = []
                     current_length = 0
                 
                 # Découper le long paragraphe
-                sub_chunks = self._split_long_paragraph(para, page_number, filename, doc_id, len(chunks))
+                sub_chunks = self._split_long_paragraph(para, page_number, filename, doc_id, chunk_idx)
                 chunks.extend(sub_chunks)
-                chunk_start_para = para['paragraph_number'] + 1
+                chunk_idx += len(sub_chunks)
+                chunk_start_para = para.paragraph_number + 1
                 
             # Si ajouter ce paragraphe dépasse la limite
             elif current_length + para_length > self.chunk_size and current_chunk:
@@ -283,24 +480,30 @@ class SemanticDocumentProcessor:
                     chunk_start_para,
                     filename,
                     doc_id,
-                    len(chunks)
+                    chunk_idx,
+                    '\n\n'.join(current_texts)
                 ))
+                chunk_idx += 1
                 
                 # Commencer un nouveau chunk avec chevauchement
-                if self.chunk_overlap > 0 and current_chunk:
+                if self.chunk_overlap > 0:
                     # Garder le dernier paragraphe pour l'overlap
-                    current_chunk = [current_chunk[-1], para]
-                    current_length = len(current_chunk[-1]['text']) + para_length
-                    chunk_start_para = current_chunk[-1]['paragraph_number']
+                    last_para = current_chunk[-1]
+                    current_chunk = [last_para, para]
+                    current_texts = [current_texts[-1], para_text]
+                    current_length = len(current_texts[0]) + para_length
+                    chunk_start_para = last_para.paragraph_number
                 else:
                     current_chunk = [para]
+                    current_texts = [para_text]
                     current_length = para_length
-                    chunk_start_para = para['paragraph_number']
+                    chunk_start_para = para.paragraph_number
             else:
                 # Ajouter le paragraphe au chunk actuel
                 if not current_chunk:
-                    chunk_start_para = para['paragraph_number']
+                    chunk_start_para = para.paragraph_number
                 current_chunk.append(para)
+                current_texts.append(para_text)
                 current_length += para_length
         
         # Ajouter le dernier chunk
@@ -311,21 +514,22 @@ class SemanticDocumentProcessor:
                 chunk_start_para,
                 filename,
                 doc_id,
-                len(chunks)
+                chunk_idx,
+                '\n\n'.join(current_texts)
             ))
         
         return chunks
     
     def _split_long_paragraph(
         self,
-        paragraph: Dict[str, Any],
+        paragraph: Paragraph,
         page_number: int,
         filename: str,
         doc_id: str,
         start_chunk_idx: int
     ) -> List[ChunkMetadata]:
         """Découpe un paragraphe trop long en respectant les phrases"""
-        text = paragraph['text']
+        text = paragraph.text
         chunks = []
         
         # Découper par phrases
@@ -333,6 +537,8 @@ class SemanticDocumentProcessor:
         
         current_text = []
         current_length = 0
+        # Partie constante des identifiants de chunk de ce paragraphe
+        id_prefix = f"{doc_id}_p{page_number}_para{paragraph.paragraph_number}_c"
         
         for sentence in sentences:
             sentence_length = len(sentence)
@@ -340,18 +546,18 @@ class SemanticDocumentProcessor:
             if current_length + sentence_length > self.chunk_size and current_text:
                 # Créer un chunk
                 chunk_text = ' '.join(current_text)
-                chunk_id = f"{doc_id}_p{page_number}_para{paragraph['paragraph_number']}_c{len(chunks)}"
+                chunk_id = f"{id_prefix}{len(chunks)}"
                 
                 chunks.append(ChunkMetadata(
                     chunk_id=chunk_id,
                     doc_id=doc_id,
                     filename=filename,
                     page_number=page_number,
-                    paragraph_number=paragraph['paragraph_number'],
-                    start_char=paragraph['start_char'],
-                    end_char=paragraph['start_char'] + len(chunk_text),
+                    paragraph_number=paragraph.paragraph_number,
+                    start_char=paragraph.start_char,
+                    end_char=paragraph.start_char + len(chunk_text),
                     text=chunk_text,
-                    semantic_type=paragraph['semantic_type']
+                    semantic_type=paragraph.semantic_type
                 ))
                 
                 # Overlap: garder la dernière phrase
@@ -368,38 +574,43 @@ class SemanticDocumentProcessor:
         # Dernier chunk
         if current_text:
             chunk_text = ' '.join(current_text)
-            chunk_id = f"{doc_id}_p{page_number}_para{paragraph['paragraph_number']}_c{len(chunks)}"
+            chunk_id = f"{id_prefix}{len(chunks)}"
             
             chunks.append(ChunkMetadata(
                 chunk_id=chunk_id,
                 doc_id=doc_id,
                 filename=filename,
                 page_number=page_number,
-                paragraph_number=paragraph['paragraph_number'],
-                start_char=paragraph['start_char'],
-                end_char=paragraph['end_char'],
+                paragraph_number=paragraph.paragraph_number,
+                start_char=paragraph.start_char,
+                end_char=paragraph.end_char,
                 text=chunk_text,
-                semantic_type=paragraph['semantic_type']
+                semantic_type=paragraph.semantic_type
             ))
         
         return chunks
     
     def _create_chunk_metadata(
         self,
-        paragraphs: List[Dict[str, Any]],
+        paragraphs: List[Paragraph],
         page_number: int,
         start_para_number: int,
         filename: str,
         doc_id: str,
-        chunk_idx: int
+        chunk_idx: int,
+        chunk_text: Optional[str] = None
     ) -> ChunkMetadata:
-        """Crée les métadonnées complètes pour un chunk"""
-        chunk_text = '\n\n'.join([p['text'] for p in paragraphs])
+        """Crée les métadonnées complètes pour un chunk
+        
+        chunk_text peut être fourni déjà joint par l'appelant.
+        """
+        if chunk_text is None:
+            chunk_text = '\n\n'.join([p.text for p in paragraphs])
         
         chunk_id = f"{doc_id}_p{page_number}_para{start_para_number}_c{chunk_idx}"
         
         # Prendre le type sémantique du premier paragraphe
-        semantic_type = paragraphs[0].get('semantic_type', 'paragraph')
+        semantic_type = paragraphs[0].semantic_type
         
         return ChunkMetadata(
             chunk_id=chunk_id,
@@ -407,19 +618,19 @@ class SemanticDocumentProcessor:
             filename=filename,
             page_number=page_number,
             paragraph_number=start_para_number,
-            start_char=paragraphs[0]['start_char'],
-            end_char=paragraphs[-1]['end_char'],
+            start_char=paragraphs[0].start_char,
+            end_char=paragraphs[-1].end_char,
             text=chunk_text,
             semantic_type=semantic_type
         )
     
-    def process_document(self, file_path: str) -> List[ChunkMetadata]:
-        """Traite un document et retourne des chunks avec métadonnées complètes"""
+    def iter_chunks(self, file_path: str) -> Iterator[ChunkMetadata]:
+        """Génère les chunks d'un document page par page, sans les accumuler"""
         self._check_file_size(file_path)
         
         file_extension = Path(file_path).suffix.lower()
         filename = Path(file_path).name
-        doc_id = hashlib.md5(filename.encode()).hexdigest()
+        document_id = doc_id(filename)
         
         # Extraction du texte selon le type
         if file_extension == '.pdf':
@@ -432,21 +643,42 @@ class SemanticDocumentProcessor:
             raise ValueError(f"Format de fichier non supporté: {file_extension}")
         
         # Chunking sémantique
-        all_chunks = []
         for page in pages:
-            chunks = self.semantic_chunk_text(
+            yield from self.semantic_chunk_text(
                 text=page['text'],
                 paragraphs=page['paragraphs'],
                 page_number=page['page_number'],
                 filename=filename,
-                doc_id=doc_id
+                doc_id=document_id
             )
-            all_chunks.extend(chunks)
+    
+    def process_document(self, file_path: str) -> List[ChunkMetadata]:
+        """Traite un document et retourne des chunks avec métadonnées complètes"""
+        all_chunks = list(self.iter_chunks(file_path))
         
-        logger.info(f"✅ Document '{filename}' traité: {len(all_chunks)} chunks sémantiques créés")
+        logger.info(f"✅ Document '{Path(file_path).name}' traité: {len(all_chunks)} chunks sémantiques créés")
         
         return all_chunks
     
+    def _iter_files(self, directory: str, recursive: bool) -> Iterator[os.DirEntry]:
+        """Parcourt un répertoire et produit les fichiers supportés au fil de l'eau
+        
+        os.scandir fournit le type de chaque entrée sans stat supplémentaire, et
+        l'extension est testée avant même de regarder le type.
+        """
+        stack = [directory]
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            stack.append(entry.path)
+                    elif (
+                        os.path.splitext(entry.name)[1].lower() in self.supported_extensions
+                        and entry.is_file()
+                    ):
+                        yield entry
+    
     def process_directory(
         self, 
         directory: str,
@@ -461,24 +693,39 @@ class SemanticDocumentProcessor:
         if not path.exists():
             raise ValueError(f"Le répertoire n'existe pas: {directory}")
         
-        # Récupérer les fichiers
-        if recursive:
-            files = [f for f in path.rglob('*') if f.is_file()]
-        else:
-            files = [f for f in path.iterdir() if f.is_file()]
+        files = self._iter_files(directory, recursive)
         
-        for file_path in files:
-            # Vérifier l'extension
-            if file_path.suffix.lower() not in self.supported_extensions:
-                continue
-            
-            try:
-                chunks = self.process_document(str(file_path))
-                results[file_path.name] = chunks
-                logger.info(f"✅ {file_path.name}: {len(chunks)} chunks")
-            except Exception as e:
-                errors[file_path.name] = str(e)
-                logger.error(f"❌ {file_path.name}: {e}")
+        # Un fichier par processus : le parsing est CPU-bound et indépendant
+        futures = {}
+        try:
+            with _new_process_pool(os.cpu_count()) as executor:
+                for f in files:
+                    futures[executor.submit(self.process_document, os.fspath(f))] = f
+                for future in as_completed(futures):
+                    file_path = futures[future]
+                    try:
+                        chunks = future.result()
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        errors[file_path.name] = str(e)
+                        logger.error(f"❌ {file_path.name}: {e}")
+                        continue
+                    results[file_path.name] = chunks
+                    logger.info(f"✅ {file_path.name}: {len(chunks)} chunks")
+        except BrokenProcessPool:
+            logger.warning("⚠️ Pool de processus indisponible, traitement séquentiel")
+            # Fichiers déjà soumis, puis ceux que le générateur n'a pas encore produits
+            for file_path in chain(list(futures.values()), files):
+                if file_path.name in results or file_path.name in errors:
+                    continue
+                try:
+                    chunks = self.process_document(os.fspath(file_path))
+                    results[file_path.name] = chunks
+                    logger.info(f"✅ {file_path.name}: {len(chunks)} chunks")
+                except Exception as e:
+                    errors[file_path.name] = str(e)
+                    logger.error(f"❌ {file_path.name}: {e}")
         
         if errors:
             logger.warning(f"⚠️ {len(errors)} fichier(s) en erreur")
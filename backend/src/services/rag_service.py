@@ -1,19 +1,269 @@
-from typing import List, Dict, Optional
-from neo4j import GraphDatabase
+from typing import List, Dict, Optional, Iterable, Tuple
+from itertools import islice
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from neo4j import GraphDatabase, READ_ACCESS, WRITE_ACCESS
+from cachetools import LRUCache
+import diskcache
 import ollama
 import hashlib
+import io
+import json
+import os
+import math
 import re
+import time
+import threading
+import uuid
 import logging
-from dataclasses import asdict
 
 # Import correct selon votre structure de projet
 try:
-    from ..services.document_processor import ChunkMetadata
+    from ..services.document_processor import ChunkMetadata, doc_id
 except ImportError:
-    from ..services.document_processor import ChunkMetadata
+    from ..services.document_processor import ChunkMetadata, doc_id
+from .cache import SemanticCache
 
 logger = logging.getLogger(__name__)
 
+# Nombre d'appels /api/embeddings parallèles quand le serveur Ollama
+# ne fournit pas encore l'endpoint batch /api/embed
+EMBEDDING_FALLBACK_WORKERS = 8
+
+
+# Marqueurs de citation [1], [2]... dans les réponses du LLM
+_CITATION_RE = re.compile(r'\[(\d+)\]')
+
+
+def _load_embedding_dims(path: Optional[str]) -> Dict[str, int]:
+    """Dimensions d'embedding déjà relevées, par modèle"""
+    if not path:
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _text_preview(text: Optional[str]) -> str:
+    """Aperçu d'un chunk affiché dans les citations (200 premiers caractères)"""
+    text = text or ''
+    return text[:200] + "..." if len(text) > 200 else text
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    """Normalise un vecteur (norme L2 = 1)
+    
+    /api/embed renvoie déjà des vecteurs unitaires, pas l'ancien /api/embeddings :
+    tous les embeddings (stockés ou de requête) ont ainsi la même échelle.
+    """
+    norm = math.sqrt(math.fsum(x * x for x in vector))
+    if not norm:
+        return vector
+    return [x / norm for x in vector]
+
+
+# Requêtes Cypher : définies une seule fois au niveau du module et toujours
+# paramétrées ($param, jamais de f-string) pour que Neo4j réutilise les plans
+# d'exécution mis en cache.
+_CREATE_INDEXES_CYPHER = (
+    # Contraintes d'unicité (adossées à un index) pour les MERGE par id ; elles
+    # remplacent les anciens index simples, qui empêcheraient leur création
+    "DROP INDEX doc_id_idx IF EXISTS",
+    "CREATE CONSTRAINT doc_id_unique IF NOT EXISTS FOR (d:Document) REQUIRE d.id IS UNIQUE",
+    "DROP INDEX chunk_id_idx IF EXISTS",
+    "CREATE CONSTRAINT chunk_id_unique IF NOT EXISTS FOR (c:Chunk) REQUIRE c.id IS UNIQUE",
+    # Lecture des chunks d'un document par nom de fichier (/document, viewer)
+    "CREATE INDEX doc_filename_idx IF NOT EXISTS FOR (d:Document) ON (d.filename)",
+    "CREATE INDEX doc_created_at_idx IF NOT EXISTS FOR (d:Document) ON (d.created_at)",
+    "CREATE INDEX chunk_hash_idx IF NOT EXISTS FOR (c:Chunk) ON (c.hash)",
+    # Chunks d'un upload en cours, retrouvés par upload au moment de la bascule
+    "CREATE INDEX staged_chunk_upload_idx IF NOT EXISTS FOR (s:StagedChunk) ON (s.upload)",
+    "CREATE INDEX staged_chunk_hash_idx IF NOT EXISTS FOR (s:StagedChunk) ON (s.hash)",
+)
+
+# Chunks laissés par un upload interrompu (arrêt du processus pendant l'ingestion)
+_DELETE_STALE_STAGED_CYPHER = """
+MATCH (s:StagedChunk)
+WHERE s.created_at < datetime() - duration('P1D')
+DETACH DELETE s
+"""
+
+# Index vectoriel (HNSW) sur les embeddings des chunks. Instruction DDL exécutée une
+# seule fois au démarrage : nom et dimension y sont insérés car le DDL n'accepte pas de paramètres.
+_VECTOR_INDEX_NAME = "chunk_embedding"
+_CREATE_VECTOR_INDEX_CYPHER = """
+CREATE VECTOR INDEX %s IF NOT EXISTS
+FOR (c:Chunk) ON (c.embedding)
+OPTIONS {indexConfig: {
+    `vector.dimensions`: %d,
+    `vector.similarity_function`: 'cosine',
+    `vector.quantization.enabled`: %s
+}}
+"""
+
+_VECTOR_INDEX_DIMENSIONS_CYPHER = """
+SHOW VECTOR INDEXES YIELD name, options
+WHERE name = $index_name
+RETURN options.indexConfig['vector.dimensions'] as dimensions
+"""
+
+_DROP_VECTOR_INDEX_CYPHER = "DROP INDEX %s IF EXISTS"
+
+# Un upload écrit ses chunks en :StagedChunk (hors de l'index vectoriel et des
+# contraintes de :Chunk), invisibles des lectures tant que la bascule n'a pas eu lieu
+_WRITE_STAGED_CHUNKS_CYPHER = """
+UNWIND $rows AS row
+CREATE (s:StagedChunk {id: row.chunk_id, upload: $upload})
+SET s.text = row.text,
+    s.page_number = row.page_number,
+    s.paragraph_number = row.paragraph_number,
+    s.start_char = row.start_char,
+    s.end_char = row.end_char,
+    s.hash = row.hash,
+    s.semantic_type = row.semantic_type,
+    s.filename = $filename,
+    s.created_at = datetime()
+WITH s, row
+// Stocké en LIST<FLOAT32> (4 octets/dimension au lieu de 8 pour une liste Cypher)
+CALL db.create.setNodeVectorProperty(s, 'embedding', row.embedding)
+"""
+
+# Bascule, dans une seule transaction : l'ancienne version du document est
+# supprimée puis les chunks de l'upload deviennent des :Chunk du Document
+_RESET_DOCUMENT_CYPHER = """
+MERGE (d:Document {id: $doc_id})
+SET d.filename = $filename,
+    d.created_at = datetime(),
+    d.chunk_count = $chunk_count,
+    d.total_pages = $total_pages
+WITH d
+OPTIONAL MATCH (d)-[:CONTAINS]->(old:Chunk)
+DETACH DELETE old
+"""
+
+_PUBLISH_STAGED_CHUNKS_CYPHER = """
+MATCH (d:Document {id: $doc_id})
+MATCH (s:StagedChunk {upload: $upload})
+REMOVE s:StagedChunk, s.upload
+SET s:Chunk
+MERGE (d)-[:CONTAINS]->(s)
+"""
+
+_DELETE_STAGED_CHUNKS_CYPHER = """
+MATCH (s:StagedChunk {upload: $upload})
+DETACH DELETE s
+"""
+
+# Un embedding déjà calculé pour chaque empreinte de contenu connue : chunks publiés
+# (dont la version précédente du document, supprimée seulement à la bascule) ou
+# déjà écrits par un upload en cours (en-têtes répétés d'un batch à l'autre)
+_FIND_EMBEDDINGS_CYPHER = """
+UNWIND $hashes AS hash
+CALL {
+    WITH hash
+    MATCH (c:Chunk {hash: hash})
+    RETURN c.embedding AS embedding
+    LIMIT 1
+  UNION ALL
+    WITH hash
+    MATCH (s:StagedChunk {hash: hash})
+    RETURN s.embedding AS embedding
+    LIMIT 1
+}
+WITH hash, head(collect(embedding)) AS embedding
+RETURN hash, embedding
+"""
+
+# Le score cosinus de l'index vectoriel Neo4j vaut (1 + cos) / 2 : reconverti en cosinus
+# L'index (éventuellement quantifié) présélectionne $candidates chunks, puis le
+# score cosinus exact est recalculé sur les embeddings float32 stockés
+_SIMILARITY_SEARCH_CYPHER = """
+CALL db.index.vector.queryNodes($index_name, $candidates, $query_embedding)
+YIELD node AS c
+WITH c, 2 * vector.similarity.cosine(c.embedding, $query_embedding) - 1 AS similarity
+WHERE similarity > $min_similarity
+ORDER BY similarity DESC
+LIMIT $top_k
+MATCH (d:Document)-[:CONTAINS]->(c)
+RETURN d.filename as filename,
+       c.id as chunk_id,
+       c.text as text,
+       c.page_number as page_number,
+       c.paragraph_number as paragraph_number,
+       c.start_char as start_char,
+       c.end_char as end_char,
+       c.semantic_type as semantic_type,
+       similarity
+ORDER BY similarity DESC
+"""
+
+_GET_CHUNK_CYPHER = """
+MATCH (c:Chunk {id: $chunk_id})
+MATCH (d:Document)-[:CONTAINS]->(c)
+RETURN d.filename as filename,
+       c.id as chunk_id,
+       c.text as text,
+       c.page_number as page_number,
+       c.paragraph_number as paragraph_number,
+       c.start_char as start_char,
+       c.end_char as end_char,
+       c.semantic_type as semantic_type
+"""
+
+_GET_PAGE_CHUNKS_CYPHER = """
+MATCH (d:Document {filename: $filename})-[:CONTAINS]->(c:Chunk)
+WHERE c.page_number = $page_number
+RETURN c.id as chunk_id,
+       c.text as text,
+       c.page_number as page_number,
+       c.paragraph_number as paragraph_number,
+       c.start_char as start_char,
+       c.end_char as end_char,
+       c.semantic_type as semantic_type
+ORDER BY c.paragraph_number
+"""
+
+_GET_DOCUMENT_CHUNKS_CYPHER = """
+MATCH (d:Document {filename: $filename})-[:CONTAINS]->(c:Chunk)
+RETURN c.id as chunk_id,
+       c.text as text,
+       c.page_number as page_number,
+       c.paragraph_number as paragraph_number,
+       c.start_char as start_char,
+       c.end_char as end_char,
+       c.semantic_type as semantic_type
+ORDER BY c.page_number, c.paragraph_number
+"""
+
+_DELETE_DOCUMENT_CYPHER = """
+MATCH (d:Document {id: $doc_id})
+OPTIONAL MATCH (d)-[:CONTAINS]->(c:Chunk)
+DETACH DELETE d, c
+RETURN count(d) as deleted_count
+"""
+
+# Migration des identifiants de Document (anciens ids MD5) vers doc_id(filename)
+_LIST_DOCUMENT_IDS_CYPHER = """
+MATCH (d:Document)
+WHERE d.filename IS NOT NULL
+RETURN d.id as id, d.filename as filename
+"""
+
+_DOCUMENT_EXISTS_CYPHER = """
+MATCH (d:Document {id: $doc_id})
+RETURN count(d) > 0 as exists
+"""
+
+_RENAME_DOCUMENT_CYPHER = """
+MATCH (d:Document {id: $old_id})
+SET d.id = $new_id
+"""
+
+_HEALTH_CHECK_CYPHER = "RETURN 1"
+
+
 
 class RAGServiceWithCitations:
     """Service RAG avec citations précises et deep linking"""
@@ -24,108 +274,400 @@ class RAGServiceWithCitations:
         neo4j_user: str, 
         neo4j_password: str, 
         ollama_url: str,
-        frontend_base_url: str = "http://localhost:3000"
+        frontend_base_url: str = "http://localhost:3000",
+        embedding_batch_size: int = 64,
+        embedding_dim: int = 768,
+        neo4j_database: str = "neo4j",
+        neo4j_pool_size: int = 50,
+        neo4j_acquisition_timeout: float = 30.0,
+        neo4j_max_connection_lifetime: float = 3600.0,
+        vector_quantization: bool = True,
+        vector_rerank_factor: int = 4,
+        embedding_cache_size: int = 4096,
+        embedding_cache_dir: Optional[str] = None,
+        embedding_cache_size_limit: int = 512 * 1024 * 1024,
+        embedding_concurrency: int = 4,
+        write_batch_size: int = 1000,
+        semantic_cache_threshold: float = 0.97,
+        semantic_cache_size: int = 256,
+        semantic_cache_ttl: float = 600.0,
+        redis_url: Optional[str] = None,
+        embedding_dim_file: Optional[str] = None
     ):
-        self.driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+        self.driver = GraphDatabase.driver(
+            neo4j_uri,
+            auth=(neo4j_user, neo4j_password),
+            max_connection_pool_size=neo4j_pool_size,
+            connection_acquisition_timeout=neo4j_acquisition_timeout,
+            max_connection_lifetime=neo4j_max_connection_lifetime
+        )
+        self.database = neo4j_database
         self.ollama_client = ollama.Client(host=ollama_url)
         self.embedding_model = "nomic-embed-text"
         self.llm_model = "mistral"
         self.frontend_base_url = frontend_base_url
+        self.embedding_batch_size = embedding_batch_size
+        self.embedding_dim = embedding_dim
+        # Dimension réellement produite par le modèle, relevée au premier embedding
+        # et conservée d'un démarrage à l'autre pour créer l'index vectoriel
+        self._embedding_dim_file = embedding_dim_file
+        known_dim = _load_embedding_dims(embedding_dim_file).get(self.embedding_model)
+        self._embedding_dim_known = known_dim is not None
+        self._embedding_dim_lock = threading.Lock()
+        if known_dim is not None:
+            self.embedding_dim = known_dim
+        self.embedding_concurrency = max(1, embedding_concurrency)
+        self.write_batch_size = write_batch_size
+        self.vector_quantization = vector_quantization
+        self.vector_rerank_factor = max(1, vector_rerank_factor)
+        # Embeddings des requêtes récentes (appelé depuis plusieurs threads) ;
+        # sur disque si un répertoire est fourni, pour survivre aux redémarrages
+        if embedding_cache_dir:
+            self._embedding_cache = diskcache.Cache(
+                embedding_cache_dir,
+                size_limit=embedding_cache_size_limit,
+                eviction_policy='least-recently-used'
+            )
+        else:
+            self._embedding_cache = LRUCache(maxsize=embedding_cache_size)
+        self._embedding_cache_lock = threading.Lock()
+        # Réponses des questions récentes, retrouvées par similarité d'embedding
+        self._semantic_cache = SemanticCache(
+            threshold=semantic_cache_threshold,
+            maxsize=semantic_cache_size,
+            ttl=semantic_cache_ttl,
+            redis_url=redis_url
+        )
+        # Passe à False si le serveur Ollama ne connaît pas /api/embed
+        self._batch_embed_supported = True
         
     def close(self):
         self.driver.close()
+        if isinstance(self._embedding_cache, diskcache.Cache):
+            self._embedding_cache.close()
+        if self._semantic_cache.redis is not None:
+            self._semantic_cache.redis.close()
+    
+    def create_indexes(self):
+        """Crée les index Neo4j utilisés par les recherches (idempotent)"""
+        with self.session() as session:
+            for statement in _CREATE_INDEXES_CYPHER:
+                session.run(statement).consume()
+            session.run(_DELETE_STALE_STAGED_CYPHER).consume()
+            self._ensure_vector_index(session)
+        logger.info("✅ Index Neo4j vérifiés")
+    
+    def _ensure_vector_index(self, session):
+        """Crée l'index vectoriel, ou le recrée s'il n'a pas la dimension des embeddings
+        
+        CREATE ... IF NOT EXISTS ne modifie pas un index existant : sans cela, les
+        chunks d'une autre dimension en seraient silencieusement exclus.
+        """
+        record = session.run(_VECTOR_INDEX_DIMENSIONS_CYPHER, index_name=_VECTOR_INDEX_NAME).single()
+        if record is not None and record['dimensions'] != self.embedding_dim:
+            logger.warning(
+                f"⚠️ Index '{_VECTOR_INDEX_NAME}' de dimension {record['dimensions']} "
+                f"(embeddings : {self.embedding_dim}) : recréation"
+            )
+            session.run(_DROP_VECTOR_INDEX_CYPHER % _VECTOR_INDEX_NAME).consume()
+        session.run(_CREATE_VECTOR_INDEX_CYPHER % (
+            _VECTOR_INDEX_NAME,
+            self.embedding_dim,
+            'true' if self.vector_quantization else 'false'
+        )).consume()
+    
+    def migrate_document_ids(self) -> int:
+        """Réaligne les Documents dont l'id n'est plus doc_id(filename) (idempotent)
+        
+        Un document resté sous son ancien id est renommé ; s'il a déjà été
+        ré-uploadé sous le nouvel id, l'ancienne copie et ses chunks sont supprimés.
+        """
+        with self.session() as session:
+            migrated = session.execute_write(self._migrate_document_ids)
+        if migrated:
+            self._semantic_cache.clear()
+            logger.info(f"✅ {migrated} document(s) migré(s) vers les nouveaux identifiants")
+        return migrated
+    
+    @staticmethod
+    def _migrate_document_ids(tx) -> int:
+        stale = [
+            (record['id'], record['filename'])
+            for record in tx.run(_LIST_DOCUMENT_IDS_CYPHER)
+            if record['id'] != doc_id(record['filename'])
+        ]
+        for old_id, filename in stale:
+            new_id = doc_id(filename)
+            if tx.run(_DOCUMENT_EXISTS_CYPHER, doc_id=new_id).single()['exists']:
+                tx.run(_DELETE_DOCUMENT_CYPHER, doc_id=old_id).consume()
+            else:
+                tx.run(_RENAME_DOCUMENT_CYPHER, old_id=old_id, new_id=new_id).consume()
+        return len(stale)
+    
+    def session(self, read_only: bool = False):
+        """Ouvre une session sur le pool du driver (base explicite, mode lecture/écriture)"""
+        return self.driver.session(
+            database=self.database,
+            default_access_mode=READ_ACCESS if read_only else WRITE_ACCESS
+        )
     
     def create_embeddings(self, text: str, max_retries: int = 3) -> List[float]:
-        """Génère des embeddings avec retry"""
-        import time
+        """Génère l'embedding d'une requête, avec cache
+        
+        Les résultats sont gardés dans un LRU indexé par le hash du contenu :
+        une requête répétée ne refait pas l'aller-retour vers Ollama.
+        """
+        key = self._content_hash(text)
+        with self._embedding_cache_lock:
+            embedding = self._embedding_cache.get(key)
+        if embedding is not None:
+            return embedding
+        
+        embedding = self._embed_one(text, max_retries)
         
+        with self._embedding_cache_lock:
+            self._embedding_cache[key] = embedding
+        return embedding
+    
+    def _embed_one(self, text: str, max_retries: int = 3) -> List[float]:
+        """Un appel /api/embeddings avec retry, sans cache (textes de chunks à l'ingestion)"""
         for attempt in range(max_retries):
             try:
                 response = self.ollama_client.embeddings(
                     model=self.embedding_model,
                     prompt=text[:8000]  # Limiter la taille
                 )
-                return response['embedding']
+                embedding = _normalize(response['embedding'])
+                break
             except Exception as e:
                 if attempt == max_retries - 1:
                     raise
                 logger.warning(f"Erreur embedding (tentative {attempt + 1}/{max_retries}): {e}")
                 time.sleep(2 ** attempt)
+        
+        self._record_embedding_dim(len(embedding))
+        return embedding
     
-    def store_document_chunks(self, chunks: List[ChunkMetadata]):
-        """Stocke les chunks avec métadonnées enrichies dans Neo4j"""
+    def _record_embedding_dim(self, dim: int) -> None:
+        """Mémorise la dimension du modèle d'embedding (une seule fois par processus)
         
-        logger.info(f"📦 Stockage de {len(chunks)} chunks...")
+        Appelée en parallèle par les threads d'embedding : le premier relevé fait foi.
+        """
+        if self._embedding_dim_known:
+            return
+        with self._embedding_dim_lock:
+            if self._embedding_dim_known:
+                return
+            
+            # L'index n'est pas recréé ici (les recherches en cours échoueraient
+            # pendant sa construction) : create_indexes s'en charge au démarrage
+            if dim != self.embedding_dim:
+                logger.warning(
+                    f"⚠️ {self.embedding_model} produit des vecteurs de dimension {dim} "
+                    f"(configurée : {self.embedding_dim}) : l'index '{_VECTOR_INDEX_NAME}' "
+                    f"sera recréé au prochain démarrage"
+                )
+                self.embedding_dim = dim
+            
+            if self._embedding_dim_file:
+                dims = _load_embedding_dims(self._embedding_dim_file)
+                dims[self.embedding_model] = dim
+                try:
+                    os.makedirs(os.path.dirname(self._embedding_dim_file) or '.', exist_ok=True)
+                    with open(self._embedding_dim_file, 'w') as f:
+                        json.dump(dims, f)
+                except OSError as e:
+                    logger.warning(f"⚠️ Impossible d'enregistrer la dimension des embeddings: {e}")
+            
+            self._embedding_dim_known = True
+    
+    def create_embeddings_batch(self, texts: List[str], max_retries: int = 3) -> List[List[float]]:
+        """Génère les embeddings d'une liste de textes en un seul appel Ollama (avec retry)
         
-        if not chunks:
-            raise ValueError("Aucun chunk à stocker")
+        Sur un serveur Ollama trop ancien pour /api/embed, les textes sont envoyés
+        un par un à /api/embeddings via un pool de threads.
+        """
+        if not self._batch_embed_supported:
+            return self._create_embeddings_parallel(texts)
         
-        doc_id = chunks[0].doc_id
-        filename = chunks[0].filename
+        for attempt in range(max_retries):
+            try:
+                response = self.ollama_client.embed(
+                    model=self.embedding_model,
+                    input=[text[:8000] for text in texts]  # Limiter la taille
+                )
+                embeddings = response['embeddings']
+                break
+            except Exception as e:
+                if isinstance(e, ollama.ResponseError) and e.status_code == 404:
+                    # 404 aussi si le modèle manque : ne mémoriser l'absence
+                    # de /api/embed que si l'ancien endpoint répond
+                    embeddings = self._create_embeddings_parallel(texts)
+                    logger.warning("⚠️ Endpoint /api/embed indisponible, embeddings calculés en parallèle")
+                    self._batch_embed_supported = False
+                    return embeddings
+                if attempt == max_retries - 1:
+                    raise
+                logger.warning(f"Erreur embedding batch (tentative {attempt + 1}/{max_retries}): {e}")
+                time.sleep(2 ** attempt)
         
-        with self.driver.session() as session:
-            with session.begin_transaction() as tx:
-                try:
-                    # Créer le nœud Document
-                    tx.run(
-                        """
-                        MERGE (d:Document {id: $doc_id})
-                        SET d.filename = $filename, 
-                            d.created_at = datetime(),
-                            d.chunk_count = $chunk_count,
-                            d.total_pages = $total_pages
-                        """,
-                        doc_id=doc_id,
-                        filename=filename,
-                        chunk_count=len(chunks),
-                        total_pages=max(c.page_number for c in chunks)
-                    )
+        if embeddings:
+            self._record_embedding_dim(len(embeddings[0]))
+        return embeddings
+    
+    def _create_embeddings_parallel(self, texts: List[str]) -> List[List[float]]:
+        """Repli : un appel /api/embeddings par texte, répartis sur plusieurs threads"""
+        with ThreadPoolExecutor(max_workers=EMBEDDING_FALLBACK_WORKERS) as executor:
+            return list(executor.map(self._embed_one, texts))
+    
+    def store_document_chunks(self, chunks: Iterable[ChunkMetadata]) -> int:
+        """Stocke les chunks d'un document dans Neo4j par batches successifs
+        
+        Accepte un itérateur (cf. SemanticDocumentProcessor.iter_chunks) : seul le
+        batch courant est en mémoire, et l'embedding / l'écriture d'un batch se fait
+        pendant que le document est encore en cours de parsing.
+        
+        Jusqu'à embedding_concurrency batches sont embeddés en parallèle (threads)
+        pendant que les précédents sont écrits, dans l'ordre, dans Neo4j : une seule
+        session pour tout le document, une transaction par write_batch_size chunks.
+        
+        Les chunks sont d'abord écrits sous une clé d'upload : la version précédente
+        du document reste seule visible jusqu'à la bascule, faite en une transaction
+        après le dernier batch. En cas d'échec, seuls les chunks de l'upload sont supprimés.
+        """
+        iterator = iter(chunks)
+        upload = uuid.uuid4().hex
+        stored = 0
+        doc_id = filename = None
+        pending = deque()  # futures des lignes à écrire, dans l'ordre du document
+        rows = []  # lignes prêtes, en attente d'une transaction
+        total_pages = 0
+        exhausted = False
+        
+        with ThreadPoolExecutor(max_workers=self.embedding_concurrency) as executor, self.session() as session:
+            try:
+                while True:
+                    while not exhausted and len(pending) < self.embedding_concurrency:
+                        batch = list(islice(iterator, self.embedding_batch_size))
+                        if not batch:
+                            exhausted = True
+                            break
+                        if doc_id is None:
+                            doc_id, filename = batch[0].doc_id, batch[0].filename
+                            logger.info(f"📦 Stockage des chunks de '{filename}'...")
+                        pending.append(executor.submit(self._prepare_rows, batch))
                     
-                    # Stocker les chunks par batch
-                    batch_size = 10
-                    for i in range(0, len(chunks), batch_size):
-                        batch = chunks[i:i + batch_size]
-                        
-                        for chunk in batch:
-                            # Générer embedding
-                            embedding = self.create_embeddings(chunk.text)
-                            
-                            tx.run(
-                                """
-                                MATCH (d:Document {id: $doc_id})
-                                MERGE (c:Chunk {id: $chunk_id})
-                                SET c.text = $text,
-                                    c.page_number = $page_number,
-                                    c.paragraph_number = $paragraph_number,
-                                    c.start_char = $start_char,
-                                    c.end_char = $end_char,
-                                    c.embedding = $embedding,
-                                    c.semantic_type = $semantic_type,
-                                    c.filename = $filename,
-                                    c.created_at = datetime()
-                                MERGE (d)-[:CONTAINS]->(c)
-                                """,
-                                doc_id=doc_id,
-                                chunk_id=chunk.chunk_id,
-                                text=chunk.text,
-                                page_number=chunk.page_number,
-                                paragraph_number=chunk.paragraph_number,
-                                start_char=chunk.start_char,
-                                end_char=chunk.end_char,
-                                embedding=embedding,
-                                semantic_type=chunk.semantic_type,
-                                filename=filename
-                            )
-                        
-                        logger.info(f"Batch {i//batch_size + 1}/{(len(chunks)-1)//batch_size + 1} traité ({len(batch)} chunks)")
+                    if pending:
+                        batch_rows, batch_pages = pending.popleft().result()
+                        rows.extend(batch_rows)
+                        total_pages = max(total_pages, batch_pages)
                     
-                    tx.commit()
-                    logger.info(f"✅ Document '{filename}' stocké avec {len(chunks)} chunks")
+                    done = exhausted and not pending
+                    if rows and (len(rows) >= self.write_batch_size or done):
+                        session.execute_write(self._write_staged_chunks, upload, filename, rows)
+                        stored += len(rows)
+                        logger.info(f"Batch écrit ({len(rows)} chunks, {stored} au total)")
+                        rows = []
                     
-                except Exception as e:
-                    tx.rollback()
-                    logger.error(f"❌ Erreur stockage document '{filename}': {e}")
-                    raise
+                    if done:
+                        break
+                
+                if stored:
+                    session.execute_write(
+                        self._publish_document, upload, doc_id, filename, stored, total_pages
+                    )
+            
+            except Exception as e:
+                for future in pending:
+                    future.cancel()
+                logger.error(f"❌ Erreur stockage document '{filename}': {e}")
+                # Ne pas laisser de chunks orphelins ; la version précédente reste intacte
+                if stored:
+                    self._delete_staged_chunks(upload)
+                raise
+        
+        if not stored:
+            raise ValueError("Aucun chunk à stocker")
+        
+        # Le corpus a changé : les réponses en cache peuvent être obsolètes
+        self._semantic_cache.clear()
+        
+        logger.info(f"✅ Document '{filename}' stocké avec {stored} chunks")
+        return stored
+    
+    def _prepare_rows(self, chunks: List[ChunkMetadata]) -> Tuple[List[Dict], int]:
+        """Calcule (ou réutilise) les embeddings d'un batch et construit les lignes UNWIND
+        
+        Retourne aussi le plus grand numéro de page, relevé pendant la construction.
+        """
+        # Ne calculer que les embeddings des contenus encore inconnus (en-têtes,
+        # pieds de page répétés, ré-upload d'un document...)
+        hashes = [self._content_hash(chunk.text) for chunk in chunks]
+        embeddings = self._find_embeddings(set(hashes))
+        missing = {h: chunk.text for h, chunk in zip(hashes, chunks) if h not in embeddings}
+        if missing:
+            embeddings.update(zip(missing, self.create_embeddings_batch(list(missing.values()))))
+        logger.debug("%d/%d embeddings réutilisés", len(chunks) - len(missing), len(chunks))
+        
+        rows = []
+        total_pages = 0
+        for chunk, h in zip(chunks, hashes):
+            rows.append({
+                'chunk_id': chunk.chunk_id,
+                'text': chunk.text,
+                'page_number': chunk.page_number,
+                'paragraph_number': chunk.paragraph_number,
+                'start_char': chunk.start_char,
+                'end_char': chunk.end_char,
+                'hash': h,
+                'embedding': embeddings[h],
+                'semantic_type': chunk.semantic_type
+            })
+            if chunk.page_number > total_pages:
+                total_pages = chunk.page_number
+        return rows, total_pages
+    
+    def _content_hash(self, text: str) -> str:
+        """Empreinte (blake2b-64) du texte réellement envoyé au modèle d'embedding"""
+        return hashlib.blake2b(f"{self.embedding_model}\n{text[:8000]}".encode(), digest_size=8).hexdigest()
+    
+    def _find_embeddings(self, hashes: set) -> Dict[str, List[float]]:
+        """Retourne les embeddings déjà stockés pour ces empreintes de contenu"""
+        with self.session(read_only=True) as session:
+            result = session.run(_FIND_EMBEDDINGS_CYPHER, hashes=list(hashes))
+            return {record['hash']: record['embedding'] for record in result}
+    
+    @staticmethod
+    def _write_staged_chunks(tx, upload: str, filename: str, rows: List[Dict]):
+        """Écrit un batch de chunks sous la clé d'upload"""
+        tx.run(_WRITE_STAGED_CHUNKS_CYPHER, upload=upload, filename=filename, rows=rows).consume()
+    
+    @staticmethod
+    def _publish_document(tx, upload: str, doc_id: str, filename: str, chunk_count: int, total_pages: int):
+        """Remplace les chunks du Document par ceux de l'upload (même transaction)"""
+        tx.run(
+            _RESET_DOCUMENT_CYPHER,
+            doc_id=doc_id,
+            filename=filename,
+            chunk_count=chunk_count,
+            total_pages=total_pages
+        ).consume()
+        tx.run(_PUBLISH_STAGED_CHUNKS_CYPHER, doc_id=doc_id, upload=upload).consume()
+    
+    def _delete_staged_chunks(self, upload: str):
+        """Supprime les chunks d'un upload abandonné"""
+        try:
+            with self.session() as session:
+                session.execute_write(lambda tx: tx.run(_DELETE_STAGED_CHUNKS_CYPHER, upload=upload).consume())
+        except Exception as e:
+            logger.warning(f"⚠️ Chunks de l'upload {upload} non supprimés: {e}")
+    
+    def delete_document(self, doc_id: str) -> bool:
+        """Supprime un document et tous ses chunks. Retourne False s'il n'existait pas"""
+        with self.session() as session:
+            record = session.run(_DELETE_DOCUMENT_CYPHER, doc_id=doc_id).single()
+        self._semantic_cache.clear()
+        return record['deleted_count'] > 0
     
     def similarity_search(
         self, 
@@ -136,53 +678,23 @@ class RAGServiceWithCitations:
         """Recherche les chunks les plus similaires avec métadonnées complètes"""
         query_embedding = self.create_embeddings(query)
         
-        with self.driver.session() as session:
+        with self.session(read_only=True) as session:
             result = session.run(
-                """
-                MATCH (d:Document)-[:CONTAINS]->(c:Chunk)
-                WHERE c.embedding IS NOT NULL
-                WITH c, d,
-                     reduce(dot = 0.0, i IN range(0, size(c.embedding)-1) | 
-                        dot + c.embedding[i] * $query_embedding[i]) /
-                     (sqrt(reduce(sum = 0.0, x IN c.embedding | sum + x * x)) *
-                      sqrt(reduce(sum = 0.0, x IN $query_embedding | sum + x * x))) 
-                     AS similarity
-                WHERE similarity > $min_similarity
-                RETURN d.filename as filename,
-                       c.id as chunk_id,
-                       c.text as text,
-                       c.page_number as page_number,
-                       c.paragraph_number as paragraph_number,
-                       c.start_char as start_char,
-                       c.end_char as end_char,
-                       c.semantic_type as semantic_type,
-                       similarity
-                ORDER BY similarity DESC
-                LIMIT $top_k
-                """,
+                _SIMILARITY_SEARCH_CYPHER,
+                index_name=_VECTOR_INDEX_NAME,
                 query_embedding=query_embedding,
+                candidates=top_k * self.vector_rerank_factor,
                 top_k=top_k,
                 min_similarity=min_similarity
             )
             
-            chunks = []
-            for record in result:
-                chunk = {
-                    'chunk_id': record['chunk_id'],
-                    'filename': record['filename'],
-                    'text': record['text'],
-                    'page_number': record['page_number'],
-                    'paragraph_number': record['paragraph_number'],
-                    'start_char': record['start_char'],
-                    'end_char': record['end_char'],
-                    'semantic_type': record['semantic_type'],
-                    'similarity': float(record['similarity'])
-                }
-                
-                # Générer le deep link
+            # Les colonnes RETURN portent déjà les noms attendus (similarity est un float)
+            chunks = [record.data() for record in result]
+            
+            # Générer les deep links et les aperçus utilisés par les citations
+            for chunk in chunks:
                 chunk['deep_link'] = self._generate_deep_link(chunk)
-                
-                chunks.append(chunk)
+                chunk['text_preview'] = _text_preview(chunk['text'])
             
             logger.info(f"🔍 Trouvé {len(chunks)} chunks pertinents (seuil: {min_similarity})")
             return chunks
@@ -190,7 +702,7 @@ class RAGServiceWithCitations:
     def _generate_deep_link(self, chunk: Dict) -> str:
         """Génère un lien profond vers le chunk exact dans le document"""
         # Format: /viewer/{doc_id}?page={page}&para={para}&highlight={chunk_id}
-        doc_id = hashlib.md5(chunk['filename'].encode()).hexdigest()
+        document_id = doc_id(chunk['filename'])
         
         # Valeurs par défaut si None
         page_number = chunk.get('page_number') or 1
@@ -198,7 +710,7 @@ class RAGServiceWithCitations:
         chunk_id = chunk.get('chunk_id', '')
         
         deep_link = (
-            f"{self.frontend_base_url}/viewer/{doc_id}"
+            f"{self.frontend_base_url}/viewer/{document_id}"
             f"?page={page_number}"
             f"&paragraph={paragraph_number}"
             f"&highlight={chunk_id}"
@@ -220,20 +732,21 @@ class RAGServiceWithCitations:
                 'context_used': 0
             }
         
-        # Construire le contexte avec numérotation
-        context_parts = []
+        # Construire le contexte avec numérotation, écrit directement dans un tampon
+        buffer = io.StringIO()
         citation_map = {}
         
         for i, chunk in enumerate(context_chunks, 1):
-            citation_id = f"[{i}]"
-            citation_map[citation_id] = chunk
+            citation_map[i] = chunk
             
-            context_parts.append(
-                f"{citation_id} {chunk['filename']}, Page {chunk['page_number']}, Paragraphe {chunk['paragraph_number']}\n"
+            if i > 1:
+                buffer.write("\n")
+            buffer.write(
+                f"[{i}] {chunk['filename']}, Page {chunk['page_number']}, Paragraphe {chunk['paragraph_number']}\n"
                 f"Texte: {chunk['text']}\n"
             )
         
-        context = "\n".join(context_parts)
+        context = buffer.getvalue()
         
         # Prompt optimisé pour forcer les citations
         prompt = f"""Tu es un assistant expert qui répond aux questions en analysant des documents. Tu DOIS OBLIGATOIREMENT citer tes sources.
@@ -299,34 +812,31 @@ RÉPONSE:"""
     def _extract_and_validate_citations(
         self, 
         answer: str, 
-        citation_map: Dict[str, Dict],
+        citation_map: Dict[int, Dict],
         context_chunks: List[Dict]
     ) -> List[Dict]:
         """Extrait et valide les citations dans la réponse"""
         citations = []
         
         # Chercher les patterns de citation: [1], [2], etc.
-        citation_pattern = r'\[(\d+)\]'
-        found_citations = re.findall(citation_pattern, answer)
+        found_citations = _CITATION_RE.findall(answer)
         
         # Dédupliquer et trier
         unique_citations = sorted(set(int(c) for c in found_citations))
         
         for citation_num in unique_citations:
-            citation_id = f"[{citation_num}]"
-            
-            if citation_id in citation_map:
-                chunk = citation_map[citation_id]
-                
+            chunk = citation_map.get(citation_num)
+            if chunk is not None:
                 citation_info = {
                     'citation_number': citation_num,
                     'filename': chunk.get('filename', 'unknown'),
                     'page_number': chunk.get('page_number', 1),
                     'paragraph_number': chunk.get('paragraph_number', 1),
-                    'text_preview': chunk['text'][:200] + "..." if len(chunk.get('text', '')) > 200 else chunk.get('text', ''),
+                    'text_preview': chunk.get('text_preview') or _text_preview(chunk.get('text')),
                     'deep_link': chunk.get('deep_link', ''),
                     'chunk_id': chunk.get('chunk_id', ''),
-                    'similarity_score': chunk.get('similarity', 0.0)
+                    'similarity_score': chunk.get('similarity', 0.0),
+                    'is_default': False
                 }
                 
                 citations.append(citation_info)
@@ -344,7 +854,7 @@ RÉPONSE:"""
                 'filename': chunk.get('filename', 'unknown'),
                 'page_number': chunk.get('page_number', 1),
                 'paragraph_number': chunk.get('paragraph_number', 1),
-                'text_preview': chunk['text'][:200] + "..." if len(chunk.get('text', '')) > 200 else chunk.get('text', ''),
+                'text_preview': chunk.get('text_preview') or _text_preview(chunk.get('text')),
                 'deep_link': chunk.get('deep_link', ''),
                 'chunk_id': chunk.get('chunk_id', ''),
                 'similarity_score': chunk.get('similarity', 0.0),
@@ -358,6 +868,19 @@ RÉPONSE:"""
         
         logger.info(f"🔍 Question: {question}")
         
+        # Question (quasi) identique déjà traitée : ni recherche ni LLM
+        # (l'embedding est gardé en cache et resservi à similarity_search)
+        question_embedding = self.create_embeddings(question)
+        params = (top_k, min_similarity)
+        cached = self._semantic_cache.get(question_embedding, params)
+        if cached is not None:
+            logger.info("♻️ Réponse servie par le cache sémantique")
+            return cached
+        # Relevée avant la recherche (et après get, qui suit les invalidations des
+        # autres workers) : une réponse construite sur un corpus modifié
+        # entre-temps n'est pas mise en cache
+        generation = self._semantic_cache.generation
+        
         # Rechercher les chunks pertinents
         relevant_chunks = self.similarity_search(question, top_k, min_similarity)
         
@@ -371,6 +894,7 @@ RÉPONSE:"""
         
         # Générer la réponse avec citations
         result = self.generate_answer_with_citations(question, relevant_chunks)
+        self._semantic_cache.set(question_embedding, result, params, generation)
         
         logger.info(f"✅ Réponse générée avec {len(result['citations'])} citation(s)")
         
@@ -378,20 +902,9 @@ RÉPONSE:"""
     
     def get_chunk_by_id(self, chunk_id: str) -> Optional[Dict]:
         """Récupère un chunk spécifique par son ID (pour le deep linking)"""
-        with self.driver.session() as session:
+        with self.session(read_only=True) as session:
             result = session.run(
-                """
-                MATCH (c:Chunk {id: $chunk_id})
-                MATCH (d:Document)-[:CONTAINS]->(c)
-                RETURN d.filename as filename,
-                       c.id as chunk_id,
-                       c.text as text,
-                       c.page_number as page_number,
-                       c.paragraph_number as paragraph_number,
-                       c.start_char as start_char,
-                       c.end_char as end_char,
-                       c.semantic_type as semantic_type
-                """,
+                _GET_CHUNK_CYPHER,
                 chunk_id=chunk_id
             )
             
@@ -414,33 +927,12 @@ RÉPONSE:"""
     
     def get_document_chunks(self, filename: str, page_number: Optional[int] = None) -> List[Dict]:
         """Récupère tous les chunks d'un document (optionnellement filtré par page)"""
-        with self.driver.session() as session:
+        with self.session(read_only=True) as session:
             if page_number:
-                query = """
-                MATCH (d:Document {filename: $filename})-[:CONTAINS]->(c:Chunk)
-                WHERE c.page_number = $page_number
-                RETURN c.id as chunk_id,
-                       c.text as text,
-                       c.page_number as page_number,
-                       c.paragraph_number as paragraph_number,
-                       c.start_char as start_char,
-                       c.end_char as end_char,
-                       c.semantic_type as semantic_type
-                ORDER BY c.paragraph_number
-                """
+                query = _GET_PAGE_CHUNKS_CYPHER
                 params = {'filename': filename, 'page_number': page_number}
             else:
-                query = """
-                MATCH (d:Document {filename: $filename})-[:CONTAINS]->(c:Chunk)
-                RETURN c.id as chunk_id,
-                       c.text as text,
-                       c.page_number as page_number,
-                       c.paragraph_number as paragraph_number,
-                       c.start_char as start_char,
-                       c.end_char as end_char,
-                       c.semantic_type as semantic_type
-                ORDER BY c.page_number, c.paragraph_number
-                """
+                query = _GET_DOCUMENT_CHUNKS_CYPHER
                 params = {'filename': filename}
             
             result = session.run(query, params)
@@ -469,8 +961,8 @@ RÉPONSE:"""
         
         # Test Neo4j
         try:
-            with self.driver.session() as session:
-                session.run("RETURN 1").single()
+            with self.session(read_only=True) as session:
+                session.run(_HEALTH_CHECK_CYPHER).single()
             health['neo4j'] = 'ok'
         except Exception as e:
             health['neo4j'] = f'error: {str(e)}'
@@ -1,8 +1,6 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { useParams, useSearchParams } from 'react-router-dom';
 import { ChevronLeft, ChevronRight, FileText, AlertCircle } from 'lucide-react';
-import MD5 from "crypto-js/md5";
-
 
 import '../DocumentViewer.css';
 
@@ -42,9 +40,7 @@ const DocumentViewer = () => {
         
         console.log({docData, docResponse , docId})
 
-        const doc = docData.documents.find(d => 
-           MD5(d.filename).toString().includes(docId)
-        );
+        const doc = docData.documents.find(d => d.id === docId);
         
         if (!doc) {
           throw new Error('Document non trouvé');